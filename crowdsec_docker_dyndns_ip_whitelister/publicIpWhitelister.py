@@ -1,33 +1,47 @@
+import atexit
 import os
+import shutil
 import socket
 import subprocess
 from datetime import datetime
 from dotenv import load_dotenv
 import sys
 import requests
+from requests.adapters import HTTPAdapter, Retry
 
 load_dotenv()
-timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def timestamp():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 DDNS_HOSTNAME = os.getenv('DDNS_HOSTNAME')
 CROWDSEC_CONTAINER_NAME = os.getenv('CROWDSEC_CONTAINER_NAME')
 RESTART_CONTAINER = os.getenv('RESTART_CONTAINER', 'false').lower() == 'true'
+RELOAD_MODE = os.getenv('RELOAD_MODE', 'restart' if RESTART_CONTAINER else 'none').lower()
 CURRENT_IP_FILE_PATH = os.getenv('CURRENT_IP_FILE_PATH', './currentIP')
 WHITELIST_FILE_PATH_IN_CONTAINER = os.getenv(
     'WHITELIST_FILE_PATH_IN_CONTAINER',
     '/etc/crowdsec/parsers/s02-enrich/publicIpWhitelist.yaml'
 )
 HEALTHCHECKS_URL = os.getenv('HEALTHCHECKS_URL')
+IP_CHECK_TTL_SECONDS = int(os.getenv('IP_CHECK_TTL_SECONDS', '60'))
+HEALTHCHECKS_FAIL_URL = f"{HEALTHCHECKS_URL}/fail" if HEALTHCHECKS_URL else None
+
+healthchecks_session = requests.Session()
+healthchecks_session.mount("https://", HTTPAdapter(
+    pool_connections=1, pool_maxsize=1,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
 
 if not DDNS_HOSTNAME:
-    print(f"{timestamp}: Error: DDNS_HOSTNAME environment variable not set.", file=sys.stderr)
+    print(f"{timestamp()}: Error: DDNS_HOSTNAME environment variable not set.", file=sys.stderr)
     if HEALTHCHECKS_URL:
-        requests.get(f"{HEALTHCHECKS_URL}/fail", timeout=10)
+        healthchecks_session.get(HEALTHCHECKS_FAIL_URL, timeout=10)
     sys.exit(1)
 if not CROWDSEC_CONTAINER_NAME:
-    print(f"{timestamp}: Error: CROWDSEC_CONTAINER_NAME environment variable not set.", file=sys.stderr)
+    print(f"{timestamp()}: Error: CROWDSEC_CONTAINER_NAME environment variable not set.", file=sys.stderr)
     if HEALTHCHECKS_URL:
-        requests.get(f"{HEALTHCHECKS_URL}/fail", timeout=10)
+        healthchecks_session.get(HEALTHCHECKS_FAIL_URL, timeout=10)
     sys.exit(1)
 
 def ping_healthchecks(url, status="success"):
@@ -35,94 +49,220 @@ def ping_healthchecks(url, status="success"):
     if not url:
         return
 
-    target_url = url if status == "success" else f"{url}/fail"
+    target_url = url if status == "success" else HEALTHCHECKS_FAIL_URL
     try:
-        response = requests.get(target_url, timeout=10)
+        response = healthchecks_session.get(target_url, timeout=10)
         response.raise_for_status()
-        print(f"{timestamp}: Successfully pinged Healthchecks.io ({status}) at {target_url}")
+        print(f"{timestamp()}: Successfully pinged Healthchecks.io ({status}) at {target_url}")
     except requests.exceptions.RequestException as e:
-        print(f"{timestamp}: Warning: Failed to ping Healthchecks.io ({status}) at {target_url}: {e}", file=sys.stderr)
+        print(f"{timestamp()}: Warning: Failed to ping Healthchecks.io ({status}) at {target_url}: {e}", file=sys.stderr)
     except Exception as e:
-        print(f"{timestamp}: Warning: An unexpected error occurred while pinging Healthchecks.io: {e}", file=sys.stderr)
+        print(f"{timestamp()}: Warning: An unexpected error occurred while pinging Healthchecks.io: {e}", file=sys.stderr)
 
 
+def ip_file_is_fresh(filename, ttl_seconds):
+    """Checks whether the cached IP file was written less than ttl_seconds ago.
+
+    On a short cron this lets the script skip the DNS lookup and all Docker work
+    for the common "nothing changed" case, at the cost of one stat call.
+    """
+    if ttl_seconds <= 0:
+        return False
+    try:
+        file_stat = os.stat(filename)
+        if file_stat.st_size == 0:
+            return False
+        return (datetime.now().timestamp() - file_stat.st_mtime) < ttl_seconds
+    except OSError:
+        return False
+
 def get_ip_from_ddns(hostname):
     try:
         ip_address = socket.gethostbyname(hostname)
-        print(f"{timestamp}: Successfully resolved {hostname} to {ip_address}")
+        print(f"{timestamp()}: Successfully resolved {hostname} to {ip_address}")
         return ip_address
     except socket.gaierror as e:
-        print(f"{timestamp}: Error resolving DNS for {hostname}: {e}", file=sys.stderr)
+        print(f"{timestamp()}: Error resolving DNS for {hostname}: {e}", file=sys.stderr)
         ping_healthchecks(HEALTHCHECKS_URL, "fail")
         return None
     except Exception as e:
-        print(f"{timestamp}: An unexpected error occurred during DNS resolution: {e}", file=sys.stderr)
+        print(f"{timestamp()}: An unexpected error occurred during DNS resolution: {e}", file=sys.stderr)
         ping_healthchecks(HEALTHCHECKS_URL, "fail")
         return None
 
 def read_from_file(filename):
     try:
-        if not os.path.exists(filename):
-             with open(filename, 'w') as file:
-                 file.write("")
-             print(f"{timestamp}: File {filename} did not exist and was created.")
-             return ""
-        with open(filename, 'r') as file:
-            content = file.read().strip()
-            return content
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            content = os.read(fd, 4096)
+        finally:
+            os.close(fd)
+        return content.decode().strip()
+    except FileNotFoundError:
+        write_to_file(filename, "")
+        print(f"{timestamp()}: File {filename} did not exist and was created.")
+        return ""
     except Exception as e:
-        print(f"{timestamp}: Error while reading the file ({filename}): {e}", file=sys.stderr)
+        print(f"{timestamp()}: Error while reading the file ({filename}): {e}", file=sys.stderr)
         ping_healthchecks(HEALTHCHECKS_URL, "fail")
         return None
 
 def write_to_file(filename, content):
+    tmp_filename = filename + ".tmp"
     try:
-        with open(filename, 'w') as file:
-            file.write(content)
-        print(f"{timestamp}: File {filename} has been written successfully.")
+        with open(tmp_filename, 'wb', buffering=4096) as file:
+            file.write(content.encode())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, filename)
+        print(f"{timestamp()}: File {filename} has been written successfully.")
         return True
     except Exception as e:
-        print(f"{timestamp}: Error while writing the file ({filename}): {e}", file=sys.stderr)
+        print(f"{timestamp()}: Error while writing the file ({filename}): {e}", file=sys.stderr)
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
         return False
 
-def update_whitelist_in_container(container_name, file_path, content):
-    command = [
-        "docker", "exec", "-i", container_name,
-        "sh", "-c", f"cat > \"{file_path}\""
-    ]
-    try:
-        result = subprocess.run(command, input=content, text=True, check=True, capture_output=True)
-        print(f"{timestamp}: Successfully updated whitelist file {file_path} in container {container_name}.")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"{timestamp}: Error executing docker command: {' '.join(command)}", file=sys.stderr)
-        print(f"{timestamp}: Return code: {e.returncode}", file=sys.stderr)
-        print(f"{timestamp}: Stderr: {e.stderr}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"{timestamp}: An unexpected error occurred during docker exec: {e}", file=sys.stderr)
-        return False
+HEREDOC_SENTINEL = "__WHITELISTER_EOF__"
+COMMAND_SENTINEL = "__WHITELISTER_DONE__"
+
+WHITELIST_TEMPLATE = """name: lucanori/publicIpWhitelist
+description: "Whitelist events from public IPv4 address"
+whitelist:
+  reason: "My public IP (dynamic)"
+  ip:
+    - "{ip}"
+"""
+
+class DockerChannel:
+    """Single channel for all commands against one container.
+
+    In-container commands go through a persistent `docker exec -i CONTAINER sh`
+    session (spawning docker exec costs hundreds of ms of daemon/shim setup per
+    call), and container-lifecycle commands share one CLI wrapper. Works with
+    podman when the docker binary is absent.
+    """
+
+    def __init__(self, container_name):
+        self.container_name = container_name
+        self.shell = None
+        self.cli = "docker" if shutil.which("docker") else "podman"
 
-def apply_crowdsec_changes(container_name, restart_flag):
-    if restart_flag:
-        command = ["docker", "restart", container_name]
+    def _get_shell(self):
+        if self.shell is not None and self.shell.poll() is None:
+            return self.shell
         try:
-            print(f"{timestamp}: Restarting container {container_name}...")
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-            print(f"{timestamp}: Container {container_name} restarted successfully.")
+            # stderr folds into stdout: nothing reads a separate stderr pipe,
+            # so error text would be lost and a chatty command could fill the
+            # pipe buffer and stall the sentinel read
+            self.shell = subprocess.Popen(
+                [self.cli, "exec", "-i", self.container_name, "sh"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True
+            )
+            return self.shell
+        except Exception as e:
+            print(f"{timestamp()}: Error starting shell session in container {self.container_name}: {e}", file=sys.stderr)
+            self.shell = None
+            return None
+
+    def run(self, command):
+        """Runs a shell command in the persistent session and returns its exit code (or None on failure).
+
+        A sentinel line carrying `$?` is echoed after the command so we know where
+        the output ends without closing the pipe.
+        """
+        shell = self._get_shell()
+        if shell is None:
+            return None
+        try:
+            shell.stdin.write(f"{command}\necho {COMMAND_SENTINEL}:$?\n")
+            shell.stdin.flush()
+            output_lines = []
+            for line in shell.stdout:
+                line = line.rstrip('\n')
+                if line.startswith(f"{COMMAND_SENTINEL}:"):
+                    return_code = int(line.split(':', 1)[1])
+                    if return_code != 0 and output_lines:
+                        output = '\n'.join(output_lines)
+                        print(f"{timestamp()}: Command output in container {self.container_name}:\n{output}", file=sys.stderr)
+                    return return_code
+                output_lines.append(line)
+            print(f"{timestamp()}: Shell session in container {self.container_name} closed unexpectedly.", file=sys.stderr)
+            self.close()
+            return None
+        except Exception as e:
+            print(f"{timestamp()}: Error running command in container {self.container_name}: {e}", file=sys.stderr)
+            self.close()
+            return None
+
+    def run_cli(self, *args):
+        """Runs a one-shot container CLI command (restart, kill, ...) and returns True on success."""
+        command = [self.cli, *args, self.container_name]
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True)
             return True
         except subprocess.CalledProcessError as e:
-            print(f"{timestamp}: Error restarting container {container_name}: {' '.join(command)}", file=sys.stderr)
-            print(f"{timestamp}: Return code: {e.returncode}", file=sys.stderr)
-            print(f"{timestamp}: Stderr: {e.stderr}", file=sys.stderr)
+            print(f"{timestamp()}: Error running container command: {' '.join(command)}", file=sys.stderr)
+            print(f"{timestamp()}: Return code: {e.returncode}", file=sys.stderr)
+            print(f"{timestamp()}: Stderr: {e.stderr}", file=sys.stderr)
             return False
         except Exception as e:
-            print(f"{timestamp}: An unexpected error occurred during docker restart: {e}", file=sys.stderr)
+            print(f"{timestamp()}: An unexpected error occurred during container command: {e}", file=sys.stderr)
             return False
+
+    def close(self):
+        if self.shell is None:
+            return
+        try:
+            if self.shell.poll() is None:
+                self.shell.stdin.close()
+                self.shell.wait(timeout=10)
+        except Exception:
+            self.shell.kill()
+        self.shell = None
+
+docker_channel = DockerChannel(CROWDSEC_CONTAINER_NAME)
+atexit.register(docker_channel.close)
+
+def update_whitelist_in_container(container_name, file_path, content):
+    command = f"cat > \"{file_path}\" <<'{HEREDOC_SENTINEL}'\n{content}{HEREDOC_SENTINEL}"
+    return_code = docker_channel.run(command)
+    if return_code == 0:
+        print(f"{timestamp()}: Successfully updated whitelist file {file_path} in container {container_name}.")
+        return True
+    if return_code is not None:
+        print(f"{timestamp()}: Error writing whitelist file {file_path} in container {container_name} (exit code {return_code}).", file=sys.stderr)
+    return False
+
+def apply_crowdsec_changes(container_name, reload_mode):
+    if reload_mode == "sighup":
+        print(f"{timestamp()}: Reloading CrowdSec in container {container_name} via SIGHUP...")
+        return_code = docker_channel.run("kill -HUP 1")
+        if return_code == 0:
+            print(f"{timestamp()}: CrowdSec reloaded successfully via SIGHUP.")
+            return True
+        print(f"{timestamp()}: SIGHUP via shell session failed, falling back to kill --signal=HUP.", file=sys.stderr)
+        success = docker_channel.run_cli("kill", "--signal=HUP")
+    elif reload_mode == "restart":
+        print(f"{timestamp()}: Restarting container {container_name}...")
+        success = docker_channel.run_cli("restart")
     else:
-        print(f"{timestamp}: Container restart is disabled (RESTART_CONTAINER=false). Manual reload/restart might be needed.")
+        print(f"{timestamp()}: Container reload is disabled (RELOAD_MODE=none). Manual reload/restart might be needed.")
         return True
 
+    if success:
+        print(f"{timestamp()}: Applied changes to container {container_name} successfully.")
+    return success
+
+if ip_file_is_fresh(CURRENT_IP_FILE_PATH, IP_CHECK_TTL_SECONDS):
+    print(f"{timestamp()}: IP file was updated less than {IP_CHECK_TTL_SECONDS}s ago, skipping check.")
+    ping_healthchecks(HEALTHCHECKS_URL, "success")
+    print(f"{timestamp()}: Script finished.")
+    sys.exit(0)
+
 current_ip = get_ip_from_ddns(DDNS_HOSTNAME)
 
 if current_ip is None:
@@ -136,35 +276,33 @@ if last_known_ip is None:
 script_successful = True
 
 if last_known_ip != current_ip:
-    print(f"{timestamp}: Public IP has changed from {last_known_ip or 'None'} to {current_ip}. Updating whitelist.")
+    print(f"{timestamp()}: Public IP has changed from {last_known_ip or 'None'} to {current_ip}. Updating whitelist.")
 
-    whitelists_file_content = f"""name: lucanori/publicIpWhitelist
-description: "Whitelist events from public IPv4 address"
-whitelist:
-  reason: "My public IP (dynamic)"
-  ip:
-    - "{current_ip}"
-"""
+    whitelists_file_content = WHITELIST_TEMPLATE.format(ip=current_ip)
 
     if update_whitelist_in_container(CROWDSEC_CONTAINER_NAME, WHITELIST_FILE_PATH_IN_CONTAINER, whitelists_file_content):
         if write_to_file(CURRENT_IP_FILE_PATH, current_ip):
-            if not apply_crowdsec_changes(CROWDSEC_CONTAINER_NAME, RESTART_CONTAINER):
-                 print(f"{timestamp}: Warning: Failed to apply changes to CrowdSec container after IP update.", file=sys.stderr)
+            if not apply_crowdsec_changes(CROWDSEC_CONTAINER_NAME, RELOAD_MODE):
+                 print(f"{timestamp()}: Warning: Failed to apply changes to CrowdSec container after IP update.", file=sys.stderr)
         else:
-            print(f"{timestamp}: Critical Error: Updated whitelist in container but failed to write new IP to {CURRENT_IP_FILE_PATH}. State is inconsistent.", file=sys.stderr)
+            print(f"{timestamp()}: Critical Error: Updated whitelist in container but failed to write new IP to {CURRENT_IP_FILE_PATH}. State is inconsistent.", file=sys.stderr)
             ping_healthchecks(HEALTHCHECKS_URL, "fail")
             script_successful = False
             sys.exit(1)
     else:
-        print(f"{timestamp}: Critical Error: Failed to update whitelist file in container {CROWDSEC_CONTAINER_NAME}.", file=sys.stderr)
+        print(f"{timestamp()}: Critical Error: Failed to update whitelist file in container {CROWDSEC_CONTAINER_NAME}.", file=sys.stderr)
         ping_healthchecks(HEALTHCHECKS_URL, "fail")
         script_successful = False
         sys.exit(1)
 
 else:
-    print(f"{timestamp}: IP address ({current_ip}) hasn't changed.")
+    print(f"{timestamp()}: IP address ({current_ip}) hasn't changed.")
+    try:
+        os.utime(CURRENT_IP_FILE_PATH)
+    except OSError:
+        pass
 
 if script_successful:
     ping_healthchecks(HEALTHCHECKS_URL, "success")
 
-print(f"{timestamp}: Script finished.")
\ No newline at end of file
+print(f"{timestamp()}: Script finished.")
\ No newline at end of file
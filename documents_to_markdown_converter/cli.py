@@ -21,14 +21,8 @@ def parse_arguments():
 
 def validate_directories(input_dir, output_dir):
     try:
-        if not os.path.exists(input_dir):
-            os.makedirs(input_dir, exist_ok=True)
-            logger.info(f"Created input directory: {input_dir}")
-        
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            logger.info(f"Created output directory: {output_dir}")
-        
+        os.makedirs(input_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         return True
     except PermissionError:
         logger.error("Permission denied when trying to create directories")
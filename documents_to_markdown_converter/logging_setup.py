@@ -4,6 +4,11 @@ import sys
 from pathlib import Path
 
 def setup_logging(log_level=logging.INFO):
+    # Nothing here logs thread or process info, so skip those lookups per record.
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
     logger = logging.getLogger("documents_to_markdown")
     logger.setLevel(log_level)
     
@@ -1,14 +1,54 @@
 #!/usr/bin/env python3
+import asyncio
 import os
 import logging
+import httpx
 from mistralai import Mistral
 from config import load_config
 from logging_setup import setup_logging, get_logger
 from cli import parse_arguments, validate_directories
-from document_processing import process_single_file, process_batch_files
-from utils import get_file_status, get_supported_files
+from document_processing import process_files_concurrently, process_batch_files
+from utils import scan_supported_files
 from md_creation import process_json_file
 
+def get_max_concurrency():
+    return int(os.environ.get("MISTRAL_CONCURRENCY", "4"))
+
+def convert_json_ready_file(filename, output_dir):
+    logger = get_logger()
+    file_stem = os.path.splitext(filename)[0]
+    file_output_dir = os.path.join(output_dir, file_stem)
+    json_path = os.path.join(file_output_dir, f"{file_stem}_response.json")
+
+    if process_json_file(json_path, file_stem, file_output_dir):
+        logger.info(f"Successfully converted JSON to markdown for {filename}")
+        return True
+    logger.error(f"Failed to convert JSON to markdown for {filename}")
+    return False
+
+async def run_processing(client, files_to_process, json_ready_files, input_dir, output_dir, config, use_batch):
+    logger = get_logger()
+
+    json_tasks = [
+        asyncio.to_thread(convert_json_ready_file, filename, output_dir)
+        for filename in json_ready_files
+    ]
+
+    if use_batch and files_to_process:
+        ocr_task = process_batch_files(client, files_to_process, input_dir, output_dir, config)
+    elif files_to_process:
+        ocr_task = process_files_concurrently(client, files_to_process, input_dir, output_dir, get_max_concurrency())
+    else:
+        ocr_task = None
+
+    if ocr_task is not None:
+        processed_count, *_ = await asyncio.gather(ocr_task, *json_tasks)
+        logger.info(f"Processing complete. Processed: {processed_count} files")
+    elif json_tasks:
+        await asyncio.gather(*json_tasks)
+    else:
+        logger.info("No files need processing")
+
 def main():
     args = parse_arguments()
     
@@ -27,66 +67,48 @@ def main():
         logger.error(str(e))
         return
     
-    client = Mistral(api_key=config["api_key"])
-    
-    supported_files = get_supported_files(input_dir)
-    
-    if not supported_files:
-        logger.error(f"No supported files found in {input_dir}")
-        logger.info("Supported formats: PDF, PPTX, DOCX, PNG, JPEG, AVIF")
-        return
-        
-    logger.info(f"Found {len(supported_files)} supported files to process")
-    
+    # Size the connection pool to the task concurrency so concurrent uploads
+    # reuse warm TLS connections instead of queueing on keep-alive slots.
+    pool_size = get_max_concurrency() * 2
+    async_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    )
+    client = Mistral(api_key=config["api_key"], async_client=async_client)
+
     use_batch = args.batch
+    supported_count = 0
     files_to_process = []
     json_ready_files = []
-    
-    for filename in supported_files:
-        file_path = os.path.join(input_dir, filename)
-        status = get_file_status(file_path, output_dir)
-        
+
+    for filename, status in scan_supported_files(input_dir, output_dir):
+        supported_count += 1
+
         if status == "needs_processing":
             files_to_process.append(filename)
         elif status == "json_ready":
             json_ready_files.append(filename)
-    
+
+    if not supported_count:
+        logger.error(f"No supported files found in {input_dir}")
+        logger.info("Supported formats: PDF, PPTX, DOCX, PNG, JPEG, AVIF")
+        return
+
+    logger.info(f"Found {supported_count} supported files to process")
+
     if args.auto and len(files_to_process) > 1:
         logger.info(f"Auto-switching to batch mode for {len(files_to_process)} files")
         use_batch = True
     
     if json_ready_files:
         logger.info(f"Found {len(json_ready_files)} files with JSON responses ready for markdown conversion")
-        for filename in json_ready_files:
-            file_path = os.path.join(input_dir, filename)
-            file_stem = os.path.splitext(filename)[0]
-            file_output_dir = os.path.join(output_dir, file_stem)
-            json_path = os.path.join(file_output_dir, f"{file_stem}_response.json")
-            
-            if process_json_file(json_path, file_stem, file_output_dir):
-                logger.info(f"Successfully converted JSON to markdown for {filename}")
-            else:
-                logger.error(f"Failed to convert JSON to markdown for {filename}")
-    
-    if use_batch and files_to_process:
-        processed_count = process_batch_files(client, files_to_process, input_dir, output_dir, config)
-        logger.info(f"Batch processing complete. Processed: {processed_count} files")
-    elif files_to_process:
-        processed_count = 0
-        
-        for filename in files_to_process:
-            file_path = os.path.join(input_dir, filename)
-            
-            success = process_single_file(client, file_path, output_dir)
-            if success:
-                processed_count += 1
-            
-            import time
-            time.sleep(1)
-        
-        logger.info(f"Processing complete. Processed: {processed_count} files")
-    else:
-        logger.info("No files need processing")
+
+    async def run_and_close():
+        try:
+            await run_processing(client, files_to_process, json_ready_files, input_dir, output_dir, config, use_batch)
+        finally:
+            await async_client.aclose()
+
+    asyncio.run(run_and_close())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
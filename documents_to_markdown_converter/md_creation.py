@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
 import os
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from utils import save_image_from_base64, generate_image_filename, ensure_directory_exists, dict_to_attr_dict
 from logging_setup import get_logger
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 logger = get_logger()
 
+# Shared pool for image writes; decode and write() both release the GIL.
+# Created lazily per process: a pool warmed before a fork leaves the child
+# with dead threads but a semaphore claiming idle workers, so submit()
+# never runs and result() blocks forever.
+_image_executor = None
+_image_executor_pid = None
+
+def _get_image_executor():
+    global _image_executor, _image_executor_pid
+    if _image_executor is None or _image_executor_pid != os.getpid():
+        _image_executor = ThreadPoolExecutor(max_workers=4)
+        _image_executor_pid = os.getpid()
+    return _image_executor
+
 def process_markdown_content(response_data, pdf_stem, pdf_output_dir):
     images_dir = os.path.join(pdf_output_dir, "images")
     ensure_directory_exists(images_dir)
@@ -14,43 +36,56 @@ def process_markdown_content(response_data, pdf_stem, pdf_output_dir):
     md_filename = f"{pdf_stem}.md"
     md_path = os.path.join(pdf_output_dir, md_filename)
     
-    combined_md = []
     processed_images = {}
-    
-    for page in response_data.pages:
-        page_index = page.index
-        page_md = page.markdown
-        
-        if hasattr(page, 'images') and page.images:
-            for img in page.images:
-                img_id = img.id
-                
-                if not hasattr(img, 'image_base64') or img.image_base64 is None:
-                    logger.warning(f"Skipping image {img_id} - no base64 data available")
-                    continue
-                
-                img_filename = generate_image_filename(page_index, img_id)
-                img_path = os.path.join(images_dir, img_filename)
-                
-                if save_image_from_base64(img.image_base64, img_path):
-                    page_md = page_md.replace(f"![{img_id}]({img_id})", f"![{img_id}](images/{img_filename})")
-                    processed_images[img_id] = f"images/{img_filename}"
-                else:
-                    logger.warning(f"Failed to save image {img_id}")
-        
-        combined_md.append(f"## Page {page_index}\n\n{page_md}\n\n")
-    
-    with open(md_path, 'w', encoding='utf-8') as f:
+
+    # Stream pages straight to the file so peak memory stays at one page
+    # instead of the whole document held twice for the final join.
+    with open(md_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
         f.write(f"# {pdf_stem}\n\n")
-        f.write("".join(combined_md))
-    
+
+        for page in response_data.pages:
+            page_index = page.index
+            page_md = page.markdown
+
+            if hasattr(page, 'images') and page.images:
+                executor = _get_image_executor()
+                futures = {}
+                for img in page.images:
+                    img_id = img.id
+
+                    if not hasattr(img, 'image_base64') or img.image_base64 is None:
+                        logger.warning(f"Skipping image {img_id} - no base64 data available")
+                        continue
+
+                    img_filename = generate_image_filename(page_index, img_id)
+                    img_path = os.path.join(images_dir, img_filename)
+
+                    future = executor.submit(save_image_from_base64, img.image_base64, img_path)
+                    futures[future] = (img_id, img_filename)
+
+                # One regex pass rewrites every image link; per-image replace()
+                # would rescan the page markdown once per saved image.
+                link_map = {}
+                for future, (img_id, img_filename) in futures.items():
+                    if future.result():
+                        link_map[f"![{img_id}]({img_id})"] = f"![{img_id}](images/{img_filename})"
+                        processed_images[img_id] = f"images/{img_filename}"
+                    else:
+                        logger.warning(f"Failed to save image {img_id}")
+
+                if link_map:
+                    pattern = re.compile("|".join(re.escape(link) for link in link_map))
+                    page_md = pattern.sub(lambda m: link_map[m.group()], page_md)
+
+            f.write(f"## Page {page_index}\n\n{page_md}\n\n")
+
     logger.info(f"Successfully saved {md_path} with {len(response_data.pages)} pages")
     return True
 
 def process_json_file(json_path, pdf_stem, pdf_output_dir):
     try:
-        with open(json_path, 'r') as f:
-            json_data = json.load(f)
+        with open(json_path, 'rb') as f:
+            json_data = json_loads(f.read())
         
         if isinstance(json_data, dict):
             if "body" in json_data and isinstance(json_data["body"], dict) and "pages" in json_data["body"]:
@@ -1,32 +1,40 @@
 #!/usr/bin/env python3
 import os
-import base64
-import uuid
+import binascii
+import itertools
+from functools import lru_cache
 from pathlib import Path
 from logging_setup import get_logger
 
 logger = get_logger()
 
-SUPPORTED_DOCUMENT_EXTENSIONS = {'.pdf', '.pptx', '.docx'}
-SUPPORTED_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.avif'}
+SUPPORTED_DOCUMENT_EXTENSIONS = frozenset({'.pdf', '.pptx', '.docx'})
+SUPPORTED_IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.avif'})
 ALL_SUPPORTED_EXTENSIONS = SUPPORTED_DOCUMENT_EXTENSIONS | SUPPORTED_IMAGE_EXTENSIONS
 
 def get_supported_files(directory):
-    supported_files = []
     if not os.path.exists(directory):
-        return supported_files
-    
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            extension = Path(filename).suffix.lower()
-            if extension in ALL_SUPPORTED_EXTENSIONS:
-                supported_files.append(filename)
-    
-    return supported_files
+        return []
 
-def get_file_type(file_path):
-    extension = Path(file_path).suffix.lower()
+    with os.scandir(directory) as it:
+        return [
+            entry.name for entry in it
+            if entry.is_file(follow_symlinks=False)
+            and os.path.splitext(entry.name)[1].lower() in ALL_SUPPORTED_EXTENSIONS
+        ]
+
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.avif': 'image/avif'
+}
+
+@lru_cache(maxsize=4096)
+def _type_for_extension(extension):
     if extension in SUPPORTED_DOCUMENT_EXTENSIONS:
         return "document"
     elif extension in SUPPORTED_IMAGE_EXTENSIONS:
@@ -34,18 +42,37 @@ def get_file_type(file_path):
     else:
         return "unsupported"
 
+def build_status_cache(output_dir):
+    """Maps each output subdirectory name to the set of filenames inside it.
+
+    One scan of the output tree replaces the three os.path.exists stats that
+    get_file_status would otherwise issue per input file.
+    """
+    cache = {}
+    try:
+        with os.scandir(output_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    cache[entry.name] = set(os.listdir(entry.path))
+    except FileNotFoundError:
+        pass
+    return cache
+
+def scan_supported_files(input_dir, output_dir):
+    """Yields (filename, status) for every supported file in one directory scan."""
+    if not os.path.exists(input_dir):
+        return
+    status_cache = build_status_cache(output_dir)
+    with os.scandir(input_dir) as it:
+        for entry in it:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in ALL_SUPPORTED_EXTENSIONS:
+                yield entry.name, get_file_status(entry.path, output_dir, status_cache)
+
+def get_file_type(file_path):
+    return _type_for_extension(os.path.splitext(file_path)[1].lower())
+
 def get_mime_type(file_path):
-    extension = Path(file_path).suffix.lower()
-    mime_types = {
-        '.pdf': 'application/pdf',
-        '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.png': 'image/png',
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.avif': 'image/avif'
-    }
-    return mime_types.get(extension, 'application/octet-stream')
+    return MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), 'application/octet-stream')
 
 def is_already_transcribed(file_path, output_dir):
     file_stem = Path(file_path).stem
@@ -68,7 +95,19 @@ def has_error(file_path, output_dir):
     error_path = os.path.join(file_output_dir, error_filename)
     return os.path.exists(error_path)
 
-def get_file_status(file_path, output_dir):
+def get_file_status(file_path, output_dir, status_cache=None):
+    if status_cache is not None:
+        file_stem = Path(file_path).stem
+        output_files = status_cache.get(file_stem, ())
+        if f"{file_stem}.md" in output_files:
+            return "transcribed"
+        elif f"{file_stem}_error" in output_files:
+            return "error"
+        elif f"{file_stem}_response.json" in output_files:
+            return "json_ready"
+        else:
+            return "needs_processing"
+
     if is_already_transcribed(file_path, output_dir):
         return "transcribed"
     elif has_error(file_path, output_dir):
@@ -83,41 +122,66 @@ def save_image_from_base64(base64_data, output_path):
         if not base64_data:
             return False
         
-        if base64_data.startswith('data:'):
-            base64_start = base64_data.find(';base64,')
-            if base64_start != -1:
-                base64_data = base64_data[base64_start + 8:]
-            
-        image_data = base64.b64decode(base64_data)
+        # One partition scan strips any "data:...;base64," prefix; the base64
+        # alphabet never contains the separator, so bare payloads pass through.
+        _, sep, payload = base64_data.partition(';base64,')
+        if sep:
+            base64_data = payload
+
+        # binascii.a2b_base64 skips b64decode's validation/altchars wrapper layer
+        image_data = binascii.a2b_base64(base64_data)
         with open(output_path, "wb") as img_file:
-            img_file.write(image_data)
+            img_file.write(memoryview(image_data))
         return True
     except Exception as e:
         logger.error(f"Error saving image: {e}")
         return False
 
+# Monotonic per-process counter; filenames only need to be unique inside one
+# document's images directory, so this replaces a uuid4 draw per image.
+_image_counter = itertools.count()
+
 def generate_image_filename(page_index, img_id):
-    return f"page{page_index}_{uuid.uuid4().hex[:8]}_{img_id}"
+    return f"page{page_index}_{next(_image_counter):08x}_{img_id}"
+
+_ensured_dirs = set()
 
 def ensure_directory_exists(directory_path):
+    if directory_path in _ensured_dirs:
+        return True
     try:
         os.makedirs(directory_path, exist_ok=True)
+        _ensured_dirs.add(directory_path)
         return True
     except Exception as e:
         logger.error(f"Error creating directory {directory_path}: {e}")
         return False
 
-class AttributeDict(dict):
+class AttributeDict:
+    """Lazy attribute view over a parsed JSON dict.
+
+    Nested values are wrapped on access instead of walking the whole tree up
+    front, so cost scales with the fields actually read rather than the size
+    of the response.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
     def __getattr__(self, key):
-        return self[key]
+        try:
+            value = self._data[key]
+        except KeyError:
+            raise AttributeError(key) from None
+        return _wrap_value(value)
+
+def _wrap_value(value):
+    if isinstance(value, dict):
+        return AttributeDict(value)
+    if isinstance(value, list):
+        return [_wrap_value(item) for item in value]
+    return value
 
 def dict_to_attr_dict(d):
-    if isinstance(d, dict):
-        attr_dict = AttributeDict(d)
-        for key, value in attr_dict.items():
-            if isinstance(value, dict):
-                attr_dict[key] = dict_to_attr_dict(value)
-            elif isinstance(value, list):
-                attr_dict[key] = [dict_to_attr_dict(item) if isinstance(item, dict) else item for item in value]
-        return attr_dict
-    return d
\ No newline at end of file
+    return _wrap_value(d)
\ No newline at end of file
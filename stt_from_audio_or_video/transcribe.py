@@ -3,18 +3,37 @@
 import os
 import sys
 import subprocess
+import hashlib
 import pathlib
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
 import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 from groq import Groq
-import mimetypes
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+
+try:
+    import av
+except ImportError:
+    av = None
 
 load_dotenv()
 
+# One keep-alive session for all Mistral uploads; retries stay with
+# transcribe_file's own loop. (The Groq SDK client is already persistent.)
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
 TRANSCRIPTION_PROVIDER = os.getenv("TRANSCRIPTION_PROVIDER", "groq").lower()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
@@ -61,23 +80,29 @@ class GroqProvider(TranscriptionProvider):
         self.client = Groq(api_key=api_key)
         self.max_file_size_mb = 25
         self.supported_formats = ['.flac', '.mp3', '.mp4', '.mpeg', '.mpga', '.m4a', '.ogg', '.wav', '.webm']
-        self.model = os.getenv("GROQ_MODEL", "whisper-large-v3")
-        self.response_format = "verbose_json"
+        self.model = os.getenv("GROQ_MODEL", "whisper-large-v3-turbo")
+        # "text" skips segment/timestamp generation server-side and returns
+        # the bare string - we only ever persist .text anyway
+        self.response_format = "text"
         self.language = os.getenv("GROQ_LANGUAGE", None)
         self.temperature = float(os.getenv("GROQ_TEMPERATURE", "0.0"))
+        # Whisper ingests 16 kHz mono, and Opus at 16k matches MP3 at
+        # 32-64k for intelligibility, so shrunk uploads are a fraction of
+        # the size (.ogg is in Groq's accepted formats)
         self.optimization_settings = {
-            'target_extension': '.mp3',
+            'target_extension': '.ogg',
+            'codec': 'libopus',
             'sample_rate': '16000',
             'channels': 1,
-            'bitrate_ladder': ['64k', '32k', '16k', '8k']
+            'bitrate_ladder': ['16k', '12k', '8k']
         }
     
     def transcribe(self, file_path: str, file_name: str) -> str:
         with open(file_path, "rb") as file:
-            file_content = file.read()
-            
+            # Hand the SDK the open file so the upload streams instead of
+            # buffering up to 25 MB of bytes first
             transcription_params = {
-                "file": (file_name, file_content),
+                "file": (file_name, file),
                 "model": self.model,
                 "response_format": self.response_format,
                 "temperature": self.temperature
@@ -88,10 +113,14 @@ class GroqProvider(TranscriptionProvider):
             
             transcription = self.client.audio.transcriptions.create(**transcription_params)
             
-            if isinstance(transcription.text, str) and transcription.text.strip().startswith('<!DOCTYPE html>'):
+            # response_format="text" returns the plain string; JSON formats
+            # return an object carrying .text
+            text = transcription if isinstance(transcription, str) else transcription.text
+            
+            if isinstance(text, str) and text.strip().startswith('<!DOCTYPE html>'):
                 raise Exception("Received HTML error page instead of transcription")
             
-            return transcription.text
+            return text
     
     def get_max_file_size_mb(self) -> int:
         return self.max_file_size_mb
@@ -104,7 +133,17 @@ class GroqProvider(TranscriptionProvider):
 
 
 class MistralProvider(TranscriptionProvider):
-    
+
+    _CONTENT_TYPE_MAP = {
+        '.mp3': 'audio/mpeg',
+        '.mp4': 'video/mp4',
+        '.mpeg': 'video/mpeg',
+        '.mpga': 'audio/mpeg',
+        '.m4a': 'audio/mp4',
+        '.wav': 'audio/wav',
+        '.webm': 'audio/webm'
+    }
+
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.mistral.ai/v1"
@@ -115,6 +154,7 @@ class MistralProvider(TranscriptionProvider):
         self.temperature = float(os.getenv("MISTRAL_TEMPERATURE", "0.0"))
         self.optimization_settings = {
             'target_extension': '.mp3',
+            'codec': 'libmp3lame',
             'sample_rate': '16000',
             'channels': 1,
             'bitrate_ladder': ['96k', '64k', '48k', '32k']
@@ -123,38 +163,32 @@ class MistralProvider(TranscriptionProvider):
     def transcribe(self, file_path: str, file_name: str) -> str:
         with open(file_path, "rb") as file:
             file_ext = os.path.splitext(file_name)[1].lower()
-            content_type = {
-                '.mp3': 'audio/mpeg',
-                '.mp4': 'video/mp4',
-                '.mpeg': 'video/mpeg',
-                '.mpga': 'audio/mpeg',
-                '.m4a': 'audio/mp4',
-                '.wav': 'audio/wav',
-                '.webm': 'audio/webm'
-            }.get(file_ext, 'audio/mpeg')
+            content_type = self._CONTENT_TYPE_MAP.get(file_ext, 'audio/mpeg')
             
-            files = {
-                'file': (file_name, file, content_type)
-            }
-            headers = {
-                'Authorization': f'Bearer {self.api_key}'
-            }
-            data = {
+            fields = {
+                'file': (file_name, file, content_type),
                 'model': self.model,
                 'response_format': 'json'
             }
-            
+
             if self.language:
-                data['language'] = self.language
-            
+                fields['language'] = self.language
+
             if self.temperature != 0.0:
-                data['temperature'] = str(self.temperature)
-            
-            response = requests.post(
+                fields['temperature'] = str(self.temperature)
+
+            # MultipartEncoder streams the body in chunks; requests' files=
+            # would assemble the whole multipart payload in memory first
+            encoder = MultipartEncoder(fields=fields)
+            headers = {
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': encoder.content_type
+            }
+
+            response = _HTTP_SESSION.post(
                 f"{self.base_url}/audio/transcriptions",
-                files=files,
+                data=encoder,
                 headers=headers,
-                data=data,
                 timeout=300
             )
             
@@ -211,85 +245,400 @@ TO_TRANSCRIBE_DIR.mkdir(exist_ok=True)
 TRANSCRIPTIONS_DIR.mkdir(exist_ok=True)
 OPTIMIZED_FILES_DIR.mkdir(exist_ok=True)
 
-SUPPORTED_EXTENSIONS = provider.get_supported_formats()
+# Manifest of completed work: lets re-runs skip files on a dict lookup keyed
+# by (path, mtime, size) instead of probing the filesystem per file.
+MANIFEST_DB_PATH = SCRIPT_DIR / "state.db"
+
+_manifest = sqlite3.connect(MANIFEST_DB_PATH, check_same_thread=False)
+_manifest.execute(
+    "CREATE TABLE IF NOT EXISTS files ("
+    "path TEXT PRIMARY KEY, mtime REAL, size INTEGER, transcription TEXT)"
+)
+_manifest.execute(
+    "CREATE TABLE IF NOT EXISTS hashes (hash TEXT PRIMARY KEY, transcription TEXT)"
+)
+_manifest.commit()
+_manifest_lock = threading.Lock()
+
+def load_manifest():
+    with _manifest_lock:
+        rows = _manifest.execute("SELECT path, mtime, size, transcription FROM files").fetchall()
+    return {path: (mtime, size, transcription) for path, mtime, size, transcription in rows}
+
+def record_completed(path, mtime, size, transcription_path):
+    with _manifest_lock:
+        _manifest.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (path, mtime, size, str(transcription_path))
+        )
+        _manifest.commit()
+
+def lookup_transcription_by_hash(content_hash):
+    with _manifest_lock:
+        row = _manifest.execute(
+            "SELECT transcription FROM hashes WHERE hash = ?", (content_hash,)
+        ).fetchone()
+    return row[0] if row else None
+
+def record_transcription_hash(content_hash, transcription_path):
+    with _manifest_lock:
+        _manifest.execute(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?)",
+            (content_hash, str(transcription_path))
+        )
+        _manifest.commit()
+
+def file_hash(file_path):
+    """blake2b of the file content in 1 MB chunks; far cheaper than a re-upload."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Provider settings are fixed for the lifetime of the process, so evaluate
+# them once here instead of re-calling the getters for every file.
+SUPPORTED_EXTENSIONS = frozenset(provider.get_supported_formats())
+OPTIMIZATION_SETTINGS = provider.get_optimization_settings()
+MAX_FILE_SIZE_MB = provider.get_max_file_size_mb()
+TARGET_SIZE_MB = MAX_FILE_SIZE_MB - 5
+TARGET_EXTENSION = OPTIMIZATION_SETTINGS['target_extension']
+SAMPLE_RATE = OPTIMIZATION_SETTINGS['sample_rate']
+CHANNELS = str(OPTIMIZATION_SETTINGS['channels'])
+CODEC = OPTIMIZATION_SETTINGS.get('codec', 'libmp3lame')
+BITRATE_LADDER = tuple(OPTIMIZATION_SETTINGS['bitrate_ladder'])
+CHUNK_SECONDS = int(os.getenv("CHUNK_SECONDS", "300"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "4"))
 
 def get_file_size_mb(file_path):
     return os.path.getsize(file_path) / (1024 * 1024)
 
 def get_transcription_path(file_path):
+    # str() at the boundary so Path and str arguments share cache entries
+    return _transcription_path_for(str(file_path))
+
+@lru_cache(maxsize=None)
+def _transcription_path_for(file_path):
     file_name = os.path.splitext(os.path.basename(file_path))[0]
     return TRANSCRIPTIONS_DIR / f"{file_name}_transcription.txt"
 
-def transcription_exists(file_path):
-    original_transcription = get_transcription_path(file_path)
-    if original_transcription.exists():
-        return True
-    
-    optimized_file_path = get_optimized_file_path(file_path)
-    optimized_file_name = os.path.basename(optimized_file_path)
-    optimized_transcription = TRANSCRIPTIONS_DIR / f"{os.path.splitext(optimized_file_name)[0]}_transcription.txt"
-    if optimized_transcription.exists():
-        return True
-    
-    return False
+@dataclass(frozen=True, slots=True)
+class FileCtx:
+    """Paths and metadata for one input file, computed once per file.
 
-def get_optimized_file_path(file_path):
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
-    settings = provider.get_optimization_settings()
-    target_extension = settings['target_extension']
-    return OPTIMIZED_FILES_DIR / f"{file_name}_processed{target_extension}"
-
-def needs_optimization(file_path):
-    file_size = get_file_size_mb(file_path)
-    file_ext = os.path.splitext(file_path)[1].lower()
-    max_size = provider.get_max_file_size_mb()
-    
-    return file_size > max_size or file_ext not in SUPPORTED_EXTENSIONS
+    The helpers below used to redo the same splitext/basename/getsize work on
+    every call; building this record up front leaves them with attribute reads.
+    """
+    path: str
+    name: str
+    stem: str
+    ext: str
+    size_bytes: int
+    size_mb: float
+    mtime: float
+    transcript_path: pathlib.Path
+    optimized_path: pathlib.Path
+    optimized_transcript_path: pathlib.Path
 
-def check_processed_file(file_path):
-    processed_path = get_optimized_file_path(file_path)
-    target_size_mb = provider.get_max_file_size_mb() - 5
-    
-    if not os.path.exists(processed_path):
+    @classmethod
+    def from_path(cls, file_path):
+        path = str(file_path)
+        return cls._build(path, os.path.basename(path), os.stat(file_path))
+
+    @classmethod
+    def from_entry(cls, entry):
+        # DirEntry.stat() reuses the result captured during the directory
+        # scan, so building the context costs no extra syscall
+        return cls._build(entry.path, entry.name, entry.stat())
+
+    @classmethod
+    def _build(cls, path, name, file_stat):
+        stem, ext = os.path.splitext(name)
+        return cls(
+            path=path,
+            name=name,
+            stem=stem,
+            ext=ext.lower(),
+            size_bytes=file_stat.st_size,
+            size_mb=file_stat.st_size / (1024 * 1024),
+            mtime=file_stat.st_mtime,
+            transcript_path=TRANSCRIPTIONS_DIR / f"{stem}_transcription.txt",
+            optimized_path=OPTIMIZED_FILES_DIR / f"{stem}_processed{TARGET_EXTENSION}",
+            optimized_transcript_path=TRANSCRIPTIONS_DIR / f"{stem}_processed_transcription.txt",
+        )
+
+# Filled by build_output_caches(); one scandir per output directory replaces
+# the per-file stat probes the skip checks would otherwise issue.
+_existing_transcripts = set()
+_existing_processed_sizes = {}
+
+def build_output_caches():
+    _existing_transcripts.clear()
+    with os.scandir(TRANSCRIPTIONS_DIR) as it:
+        _existing_transcripts.update(
+            entry.name for entry in it if entry.name.endswith('_transcription.txt')
+        )
+
+    _existing_processed_sizes.clear()
+    with os.scandir(OPTIMIZED_FILES_DIR) as it:
+        _existing_processed_sizes.update(
+            {entry.name: entry.stat().st_size for entry in it if entry.is_file()}
+        )
+
+def transcription_exists(ctx):
+    return (ctx.transcript_path.name in _existing_transcripts
+            or ctx.optimized_transcript_path.name in _existing_transcripts)
+
+def needs_optimization(ctx):
+    return ctx.size_mb > MAX_FILE_SIZE_MB or ctx.ext not in SUPPORTED_EXTENSIONS
+
+def check_processed_file(ctx):
+    processed_path = ctx.optimized_path
+    target_size_mb = TARGET_SIZE_MB
+
+    size_bytes = _existing_processed_sizes.get(processed_path.name)
+    if size_bytes is None:
         return None
-    
-    file_size = get_file_size_mb(processed_path)
+
+    file_size = size_bytes / (1024 * 1024)
     if file_size <= target_size_mb:
         return processed_path
-    
+
     print(f"  Existing processed file is too large ({file_size:.2f} MB > {target_size_mb} MB), deleting and recreating")
     os.remove(processed_path)
+    del _existing_processed_sizes[processed_path.name]
     return None
 
-def optimize_file(file_path):
-    input_file = str(file_path)
-    output_file = str(get_optimized_file_path(file_path))
-    target_size_mb = provider.get_max_file_size_mb() - 5
-    
-    settings = provider.get_optimization_settings()
-    sample_rate = settings['sample_rate']
-    channels = settings['channels']
-    bitrate_ladder = settings['bitrate_ladder']
-    
-    file_ext = os.path.splitext(file_path)[1].lower()
-    
-    print(f"Optimizing: {os.path.basename(file_path)} (target: {target_size_mb} MB)")
-    
-    for bitrate in bitrate_ladder:
+def _parse_bitrate(bitrate):
+    return int(bitrate.rstrip('k')) * 1000
+
+def _codec_args():
+    if CODEC == 'libopus':
+        return ['-c:a', 'libopus', '-application', 'voip']
+    return ['-c:a', CODEC]
+
+def _probe_duration_seconds(input_file):
+    if av is not None:
+        try:
+            with av.open(input_file) as container:
+                if container.duration:
+                    return container.duration / av.time_base
+        except Exception:
+            pass
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'csv=p=0', input_file],
+            check=True, capture_output=True, text=True
+        )
+        return float(result.stdout.strip())
+    except Exception:
+        return None
+
+_VIDEO_CONTAINER_EXTENSIONS = frozenset({'.mp4', '.webm', '.mpeg'})
+_AUDIO_COPY_EXTENSIONS = {'mp3': '.mp3', 'aac': '.m4a', 'opus': '.webm', 'vorbis': '.ogg'}
+
+@lru_cache(maxsize=1)
+def _detect_hwaccel():
+    """Picks the first hardware decoder this ffmpeg build was compiled with.
+
+    -hwaccels only reports build-time support, not whether this machine can
+    actually drive the device (a cuda build with no GPU still lists cuda),
+    so callers must be ready to fall back to software decode.
+    """
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-hwaccels'],
+            check=True, capture_output=True, text=True
+        )
+    except Exception:
+        return None
+    available = set(result.stdout.split())
+    for hwaccel in ('cuda', 'vaapi', 'videotoolbox', 'qsv'):
+        if hwaccel in available:
+            return hwaccel
+    return None
+
+_hwaccel_usable = True
+
+def _disable_hwaccel():
+    global _hwaccel_usable
+    _hwaccel_usable = False
+
+def _hwaccel_args():
+    """Flags requesting hardware decode; empty once a decode has failed."""
+    if not _hwaccel_usable:
+        return []
+    hwaccel = _detect_hwaccel()
+    if not hwaccel:
+        return []
+    args = ['-hwaccel', hwaccel]
+    if hwaccel == 'vaapi':
+        args += ['-hwaccel_output_format', 'vaapi']
+    return args
+
+def _probe_audio_codec(input_file):
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+             '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', input_file],
+            check=True, capture_output=True, text=True
+        )
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+def _try_audio_stream_copy(ctx, target_size_mb):
+    """Demuxes a video's audio track without re-encoding when the API accepts it.
+
+    -acodec copy remuxes in milliseconds, so a video whose audio track is
+    already small and in a supported codec skips the CBR re-encode entirely.
+    """
+    codec = _probe_audio_codec(ctx.path)
+    target_ext = _AUDIO_COPY_EXTENSIONS.get(codec)
+    if target_ext is None or target_ext not in SUPPORTED_EXTENSIONS:
+        return None
+
+    output_file = str(OPTIMIZED_FILES_DIR / f"{ctx.stem}_processed{target_ext}")
+
+    try:
+        subprocess.run(
+            ['ffmpeg', '-y', '-i', ctx.path, '-vn', '-acodec', 'copy',
+             '-map', '0:a:0', output_file],
+            check=True, capture_output=True
+        )
+    except subprocess.CalledProcessError:
+        return None
+
+    if os.path.exists(output_file):
+        file_size = get_file_size_mb(output_file)
+        if file_size <= target_size_mb:
+            print(f"  Extracted audio track via stream copy ({codec}, {file_size:.2f} MB)")
+            return output_file
+        os.remove(output_file)
+    return None
+
+def _bitrates_to_try(input_file, target_size_mb):
+    """Puts a duration-derived bitrate ahead of the ladder when possible.
+
+    CBR output size is roughly bitrate x duration, so the first encode can aim
+    directly at the target (with 8% headroom for container overhead) and the
+    ladder only runs if that single attempt still comes out oversized.
+    """
+    duration_s = _probe_duration_seconds(input_file)
+    if not duration_s:
+        return BITRATE_LADDER
+
+    target_bps = int(target_size_mb * 1024 * 1024 * 8 / duration_s * 0.92)
+    target_bps = min(max(target_bps, 8000), _parse_bitrate(BITRATE_LADDER[0]))
+    return (f"{target_bps // 1000}k", *BITRATE_LADDER)
+
+def _decode_audio_frames(input_file):
+    """Decodes and resamples the audio track once so ladder retries only re-encode."""
+    layout = 'mono' if CHANNELS == '1' else 'stereo'
+    resampler = av.AudioResampler(format='s16', layout=layout, rate=int(SAMPLE_RATE))
+    frames = []
+    with av.open(input_file) as container:
+        for frame in container.decode(audio=0):
+            frames.extend(resampler.resample(frame))
+    frames.extend(resampler.resample(None))
+    return frames
+
+def _encode_frames(frames, output_file, bitrate):
+    # Mirror the ffmpeg path's -application voip tuning for Opus
+    options = {'application': 'voip'} if CODEC == 'libopus' else None
+    with av.open(output_file, 'w') as out:
+        stream = out.add_stream(CODEC, rate=int(SAMPLE_RATE), options=options)
+        # Without an explicit layout the codec context defaults to stereo
+        # and silently upmixes the mono frames back to two channels
+        stream.layout = 'mono' if CHANNELS == '1' else 'stereo'
+        stream.bit_rate = _parse_bitrate(bitrate)
+        for frame in frames:
+            out.mux(stream.encode(frame))
+        out.mux(stream.encode(None))
+
+def _optimize_with_pyav(input_file, output_file, target_size_mb, bitrates):
+    frames = _decode_audio_frames(input_file)
+
+    for bitrate in bitrates:
+        print(f"  Attempting optimization with bitrate: {bitrate}")
+        _encode_frames(frames, output_file, bitrate)
+
+        file_size = get_file_size_mb(output_file)
+        if file_size <= target_size_mb:
+            print(f"  Successfully optimized to {file_size:.2f} MB with bitrate {bitrate}")
+            return output_file
+        print(f"  File still too large: {file_size:.2f} MB > {target_size_mb} MB, trying lower bitrate")
+
+    print(f"  Failed to optimize file under {target_size_mb} MB after trying all bitrates")
+
+    if os.path.exists(output_file):
+        file_size = get_file_size_mb(output_file)
+        print(f"  Using best effort result: {file_size:.2f} MB")
+        return output_file
+
+    return None
+
+def optimize_file(ctx):
+    input_file = ctx.path
+    output_file = str(ctx.optimized_path)
+    target_size_mb = TARGET_SIZE_MB
+
+    file_ext = ctx.ext
+
+    print(f"Optimizing: {ctx.name} (target: {target_size_mb} MB)")
+
+    if file_ext in _VIDEO_CONTAINER_EXTENSIONS:
+        copied = _try_audio_stream_copy(ctx, target_size_mb)
+        if copied:
+            return copied
+
+    bitrates = _bitrates_to_try(input_file, target_size_mb)
+
+    # In-process libav path: one subprocess-free decode shared across ladder
+    # retries instead of ffmpeg re-decoding the input at every bitrate
+    if av is not None:
+        try:
+            return _optimize_with_pyav(input_file, output_file, target_size_mb, bitrates)
+        except Exception as e:
+            print(f"  PyAV optimization failed ({e}), falling back to ffmpeg")
+
+    for bitrate in bitrates:
         try:
             if file_ext in ['.mp3', '.mpga', '.m4a', '.ogg', '.wav', '.flac']:
-                cmd = [
-                    'ffmpeg', '-y', '-i', input_file, '-b:a', bitrate,
-                    '-ac', str(channels), '-ar', sample_rate, output_file
+                # libmp3lame is single-threaded; pinning ffmpeg to one thread
+                # stops it spawning workers that just contend with the
+                # transcription pool
+                hwaccel_args = []
+                cmd_tail = [
+                    '-i', input_file,
+                    '-threads', '1', '-filter_threads', '1',
+                    *_codec_args(), '-b:a', bitrate,
+                    '-ac', CHANNELS, '-ar', SAMPLE_RATE, output_file
                 ]
             else:
-                cmd = [
-                    'ffmpeg', '-y', '-i', input_file, '-vn', '-b:a', bitrate,
-                    '-ac', str(channels), '-ar', sample_rate, output_file
+                hwaccel_args = _hwaccel_args()
+                cmd_tail = [
+                    '-i', input_file, '-vn',
+                    '-threads', '1', '-filter_threads', '1',
+                    *_codec_args(), '-b:a', bitrate,
+                    '-ac', CHANNELS, '-ar', SAMPLE_RATE, output_file
                 ]
-            
+
             print(f"  Attempting optimization with bitrate: {bitrate}")
-            subprocess.run(cmd, check=True, capture_output=True)
+            try:
+                subprocess.run(['ffmpeg', '-y', *hwaccel_args, *cmd_tail],
+                               check=True, capture_output=True)
+            except subprocess.CalledProcessError:
+                if not hwaccel_args:
+                    raise
+                # The build advertises an accelerator this machine can't
+                # drive; retry in software and stop requesting hardware
+                # decode for the rest of the run
+                print("  Hardware decode failed, retrying with software decode")
+                _disable_hwaccel()
+                subprocess.run(['ffmpeg', '-y', *cmd_tail],
+                               check=True, capture_output=True)
             
             file_size = get_file_size_mb(output_file)
             if file_size <= target_size_mb:
@@ -311,18 +660,82 @@ def optimize_file(file_path):
     
     return None
 
+def _split_into_chunks(file_path, chunk_dir):
+    """Splits a file into ~CHUNK_SECONDS segments without re-encoding.
+
+    The segment muxer with -c copy only remuxes, so cutting an hour-long
+    file takes a couple of seconds.
+    """
+    ext = os.path.splitext(file_path)[1]
+    pattern = os.path.join(chunk_dir, f"chunk_%03d{ext}")
+    subprocess.run(
+        ['ffmpeg', '-y', '-i', file_path, '-f', 'segment',
+         '-segment_time', str(CHUNK_SECONDS), '-c', 'copy', pattern],
+        check=True, capture_output=True
+    )
+    return sorted(
+        os.path.join(chunk_dir, name)
+        for name in os.listdir(chunk_dir)
+        if name.startswith('chunk_')
+    )
+
+def _transcribe_long_file(file_path, file_name):
+    """Transcribes a long file as concurrently uploaded segments.
+
+    A single upload of an hour-long file is one long serial round trip;
+    five-minute chunks with several in flight finish in roughly the time
+    of the slowest chunk. Chunk order is preserved when joining the text.
+    """
+    with tempfile.TemporaryDirectory() as chunk_dir:
+        chunks = _split_into_chunks(file_path, chunk_dir)
+        if len(chunks) < 2:
+            return provider.transcribe(file_path, file_name)
+
+        print(f"  Splitting {file_name} into {len(chunks)} chunks of ~{CHUNK_SECONDS}s")
+        with ThreadPoolExecutor(max_workers=min(CHUNK_WORKERS, len(chunks))) as pool:
+            texts = list(pool.map(
+                lambda chunk: provider.transcribe(chunk, os.path.basename(chunk)),
+                chunks
+            ))
+    return "\n".join(text.strip() for text in texts)
+
 def transcribe_file(file_path, max_retries=3, retry_delay=5):
     file_name = os.path.basename(file_path)
     print(f"Transcribing: {file_name}")
-    
+
+    # Identical content already transcribed (renamed input, repeated retry)
+    # is served from the manifest instead of re-uploading
+    content_hash = file_hash(file_path)
+    cached_transcription = lookup_transcription_by_hash(content_hash)
+    if cached_transcription and os.path.exists(cached_transcription):
+        transcription_path = get_transcription_path(file_path)
+        if str(transcription_path) != cached_transcription:
+            shutil.copyfile(cached_transcription, transcription_path)
+        _existing_transcripts.add(transcription_path.name)
+        print(f"Reused cached transcription for identical content: {file_name}")
+        return True
+
+    duration = _probe_duration_seconds(file_path)
+    use_chunks = duration is not None and duration > 2 * CHUNK_SECONDS
+
     for attempt in range(max_retries):
         try:
-            transcription_text = provider.transcribe(file_path, file_name)
+            if use_chunks:
+                try:
+                    transcription_text = _transcribe_long_file(file_path, file_name)
+                except subprocess.CalledProcessError:
+                    # Some containers don't segment cleanly; fall back to
+                    # the single upload rather than failing the file
+                    transcription_text = provider.transcribe(file_path, file_name)
+            else:
+                transcription_text = provider.transcribe(file_path, file_name)
             
             transcription_path = get_transcription_path(file_path)
             with open(transcription_path, "w", encoding="utf-8") as f:
                 f.write(transcription_text)
-            
+
+            _existing_transcripts.add(transcription_path.name)
+            record_transcription_hash(content_hash, transcription_path)
             print(f"Transcription saved to: {transcription_path}")
             return True
             
@@ -352,74 +765,137 @@ def transcribe_file(file_path, max_retries=3, retry_delay=5):
                 
                 return False
 
+@dataclass(slots=True)
+class Stats:
+    """Run counters shared by the producer and the transcribe workers."""
+    total: int = 0
+    skipped: int = 0
+    optimized: int = 0
+    transcribed: int = 0
+    failed: int = 0
+
 def process_files():
-    files = [f for f in TO_TRANSCRIBE_DIR.iterdir() if f.is_file()]
+    with os.scandir(TO_TRANSCRIBE_DIR) as it:
+        files = [entry for entry in it if entry.is_file()]
     
     if not files:
         print("No files found in the to_transcribe directory.")
         return
     
     print(f"Found {len(files)} files to process.")
-    
-    stats = {
-        "total": len(files),
-        "skipped": 0,
-        "optimized": 0,
-        "transcribed": 0,
-        "failed": 0
-    }
-    
-    for i, file_path in enumerate(files, 1):
-        print(f"\n[{i}/{stats['total']}] Processing: {file_path.name}")
-        
-        if transcription_exists(file_path):
-            print(f"  Transcription already exists for: {file_path.name}")
-            stats["skipped"] += 1
-            continue
-        
-        existing_processed = check_processed_file(file_path)
-        if existing_processed:
-            print(f"  Using existing processed file: {os.path.basename(existing_processed)} "
-                  f"({get_file_size_mb(existing_processed):.2f} MB)")
-            file_to_transcribe = existing_processed
-        else:
-            file_size_mb = get_file_size_mb(file_path)
-            file_ext = os.path.splitext(file_path)[1].lower()
-            
-            if needs_optimization(file_path):
-                print(f"  File needs optimization: {file_path.name} ({file_size_mb:.2f} MB, format: {file_ext})")
-                optimized_path = optimize_file(file_path)
-                if optimized_path:
-                    file_to_transcribe = optimized_path
-                    stats["optimized"] += 1
-                    
-                    optimized_size_mb = get_file_size_mb(optimized_path)
-                    size_reduction = file_size_mb - optimized_size_mb
-                    reduction_percent = (size_reduction / file_size_mb) * 100 if file_size_mb > 0 else 0
-                    
-                    print(f"  Optimization complete: {file_size_mb:.2f} MB → {optimized_size_mb:.2f} MB "
-                          f"(saved {size_reduction:.2f} MB, {reduction_percent:.1f}%)")
-                else:
-                    print(f"  Skipping file due to optimization failure: {file_path.name}")
-                    stats["failed"] += 1
+
+    build_output_caches()
+    manifest = load_manifest()
+
+    stats = Stats(total=len(files))
+    stats_lock = threading.Lock()
+
+    # ffmpeg (CPU-bound subprocess) and the API uploads (network-bound) run as
+    # a two-stage pipeline: a producer thread prepares files while a small pool
+    # of workers transcribes them concurrently - provider calls block on socket
+    # I/O, so threads overlap the API latency. The bounded queue keeps ffmpeg
+    # from running far ahead of slow uploads.
+    transcribe_workers = int(os.getenv("TRANSCRIBE_WORKERS", "4"))
+    work_queue = queue.Queue(maxsize=max(2, transcribe_workers))
+    _QUEUE_END = object()
+
+    def prepare_files():
+        # The sentinel must go out even if the producer dies (a file
+        # deleted mid-scan, a failed os.remove): otherwise the workers
+        # and the main thread block on the queue forever
+        try:
+            for i, entry in enumerate(files, 1):
+                print(f"\n[{i}/{stats.total}] Processing: {entry.name}")
+
+                ctx = FileCtx.from_entry(entry)
+
+                manifest_entry = manifest.get(ctx.path)
+                if (manifest_entry
+                        and manifest_entry[0] == ctx.mtime
+                        and manifest_entry[1] == ctx.size_bytes
+                        and manifest_entry[2]):
+                    print(f"  Manifest records a completed transcription for: {ctx.name}")
+                    with stats_lock:
+                        stats.skipped += 1
                     continue
-            else:
-                print(f"  File doesn't need optimization: {file_path.name} ({file_size_mb:.2f} MB, format: {file_ext})")
-                file_to_transcribe = file_path
-        
-        success = transcribe_file(file_to_transcribe)
-        if success:
-            stats["transcribed"] += 1
-        else:
-            stats["failed"] += 1
-    
+
+                if transcription_exists(ctx):
+                    print(f"  Transcription already exists for: {ctx.name}")
+                    with stats_lock:
+                        stats.skipped += 1
+                    continue
+
+                existing_processed = check_processed_file(ctx)
+                if existing_processed:
+                    print(f"  Using existing processed file: {os.path.basename(existing_processed)} "
+                          f"({get_file_size_mb(existing_processed):.2f} MB)")
+                    work_queue.put((ctx, existing_processed))
+                    continue
+
+                file_size_mb = ctx.size_mb
+                file_ext = ctx.ext
+
+                if needs_optimization(ctx):
+                    print(f"  File needs optimization: {ctx.name} ({file_size_mb:.2f} MB, format: {file_ext})")
+                    optimized_path = optimize_file(ctx)
+                    if optimized_path:
+                        with stats_lock:
+                            stats.optimized += 1
+
+                        optimized_size_mb = get_file_size_mb(optimized_path)
+                        size_reduction = file_size_mb - optimized_size_mb
+                        reduction_percent = (size_reduction / file_size_mb) * 100 if file_size_mb > 0 else 0
+
+                        print(f"  Optimization complete: {file_size_mb:.2f} MB → {optimized_size_mb:.2f} MB "
+                              f"(saved {size_reduction:.2f} MB, {reduction_percent:.1f}%)")
+                        work_queue.put((ctx, optimized_path))
+                    else:
+                        print(f"  Skipping file due to optimization failure: {ctx.name}")
+                        with stats_lock:
+                            stats.failed += 1
+                else:
+                    print(f"  File doesn't need optimization: {ctx.name} ({file_size_mb:.2f} MB, format: {file_ext})")
+                    work_queue.put((ctx, ctx.path))
+
+        finally:
+            work_queue.put(_QUEUE_END)
+
+    producer = threading.Thread(target=prepare_files, daemon=True)
+    producer.start()
+
+    def transcribe_worker():
+        while True:
+            item = work_queue.get()
+            if item is _QUEUE_END:
+                # Put the sentinel back so sibling workers shut down too
+                work_queue.put(_QUEUE_END)
+                return
+
+            ctx, file_to_transcribe = item
+            success = transcribe_file(file_to_transcribe)
+            if success:
+                record_completed(ctx.path, ctx.mtime, ctx.size_bytes,
+                                 get_transcription_path(file_to_transcribe))
+            with stats_lock:
+                if success:
+                    stats.transcribed += 1
+                else:
+                    stats.failed += 1
+
+    with ThreadPoolExecutor(max_workers=transcribe_workers) as pool:
+        workers = [pool.submit(transcribe_worker) for _ in range(transcribe_workers)]
+        for worker in workers:
+            worker.result()
+
+    producer.join()
+
     print("\n" + "="*50)
     print("Transcription Process Summary:")
-    print(f"  Total files processed: {stats['total']}")
-    print(f"  Files skipped (already transcribed): {stats['skipped']}")
-    print(f"  Files optimized: {stats['optimized']}")
-    print(f"  Files successfully transcribed: {stats['transcribed']}")
-    print(f"  Files failed: {stats['failed']}")
+    print(f"  Total files processed: {stats.total}")
+    print(f"  Files skipped (already transcribed): {stats.skipped}")
+    print(f"  Files optimized: {stats.optimized}")
+    print(f"  Files successfully transcribed: {stats.transcribed}")
+    print(f"  Files failed: {stats.failed}")
     print("="*50)
 
 if __name__ == "__main__":